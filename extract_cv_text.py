@@ -4,104 +4,350 @@ PDF Text Extractor for CV
 Extracts text content from PDF files for further processing
 """
 
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import os
+import shutil
 import sys
-import PyPDF2
-import pdfplumber
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-def extract_text_pypdf2(pdf_path):
-    """Extract text using PyPDF2"""
+def parse_pages(spec):
+    """Parse a page spec like "1-3,7" into sorted, merged 1-based (start, end) ranges"""
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        try:
+            if "-" in part:
+                start, end = (int(n) for n in part.split("-", 1))
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid page range: {part!r}")
+        if start < 1 or end < start:
+            raise argparse.ArgumentTypeError(f"invalid page range: {part!r}")
+        ranges.append((start, end))
+    # Kept as ranges so a huge selection like "1-5000" is never expanded before it
+    # has been checked against the document
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _count_pages(pages):
+    return sum(end - start + 1 for start, end in pages)
+
+def _format_ranges(ranges):
+    return ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+class PageRangeError(ValueError):
+    """Raised when --pages asks for pages the document does not have"""
+
+def _page_indices(pages, n_pages):
+    """0-based indices for the requested 1-based page ranges (None means all)"""
+    if pages is None:
+        return list(range(n_pages))
+    missing = [(max(start, n_pages + 1), end) for start, end in pages if end > n_pages]
+    if missing:
+        label = "page" if _count_pages(missing) == 1 else "pages"
+        raise PageRangeError(
+            f"{label} {_format_ranges(missing)} out of range (document has {n_pages} pages)"
+        )
+    return [idx for start, end in pages for idx in range(start - 1, end)]
+
+def iter_pages_pymupdf(data, pages=None):
+    """Yield (page_idx, text) using PyMuPDF (C-backed, much faster than the pure-Python parsers)"""
+    # PDF libraries are imported on first use so unused fallbacks cost nothing at startup
+    import fitz  # PyMuPDF
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for idx in _page_indices(pages, doc.page_count):
+            yield idx, doc[idx].get_text("text")
+
+# PDF bytes for pool workers, sent once per worker process rather than once per page
+_worker_data = None
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+def _run_in_worker(extract_page, page_idx):
+    return extract_page(_worker_data, page_idx)
+
+def _iter_mapped_pages(extract_page, data, indices):
+    """Yield (idx, extract_page(data, idx)) for every page index, in parallel when there is more than one"""
+    if len(indices) <= 1:
+        for idx in indices:
+            yield idx, extract_page(data, idx)
+        return
+    # Workers are all started up front, so never start more than there are pages
+    max_workers = min(len(indices), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(data,)) as executor:
+        # map() yields results in page order
+        yield from zip(indices, executor.map(partial(_run_in_worker, extract_page), indices))
+
+# Parsed PdfReader for the current process, so each worker parses the document once
+# rather than once per page
+_pypdf2_reader = (None, None)
+
+def _extract_page_pypdf2(data, page_idx):
+    """Extract the text of a single page using PyPDF2"""
+    global _pypdf2_reader
+    import PyPDF2
+    if _pypdf2_reader[0] is not data:
+        _pypdf2_reader = (data, PyPDF2.PdfReader(io.BytesIO(data)))
+    return _pypdf2_reader[1].pages[page_idx].extract_text()
+
+def iter_pages_pypdf2(data, pages=None):
+    """Yield (page_idx, text) using PyPDF2"""
+    import PyPDF2
+    n_pages = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+    yield from _iter_mapped_pages(_extract_page_pypdf2, data, _page_indices(pages, n_pages))
+
+def _extract_page_pdfplumber(data, page_idx):
+    """Extract the text of a single page using pdfplumber"""
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data), pages=[page_idx + 1]) as pdf:
+        return pdf.pages[0].extract_text()
+
+def iter_pages_pdfplumber(data, pages=None):
+    """Yield (page_idx, text) using pdfplumber (usually better for complex layouts)"""
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        n_pages = len(pdf.pages)
+    for idx, page_text in _iter_mapped_pages(_extract_page_pdfplumber, data, _page_indices(pages, n_pages)):
+        if page_text:
+            yield idx, page_text
+
+# Below this many characters a whole document's text is treated as incomplete
+MIN_DOCUMENT_CHARS = 200
+# An explicit --pages selection only needs this many per selected page (up to the above)
+MIN_PAGE_CHARS = 50
+
+def _looks_good(preview, n_chars, pages=None):
+    """Heuristic: very short or letter-free output usually means a scanned or complex layout"""
+    min_chars = MIN_DOCUMENT_CHARS
+    if pages is not None:
+        min_chars = min(min_chars, MIN_PAGE_CHARS * _count_pages(pages))
+    return n_chars > min_chars and any(c.isalpha() for c in preview)
+
+OUTPUT_FILE = "cv_extracted_text.txt"
+PREVIEW_CHARS = 500
+
+# Header written above the extracted text, keyed by extractor name
+OUTPUT_HEADERS = {
+    "PyMuPDF": "=== CV TEXT EXTRACTED WITH PYMUPDF ===\n\n",
+    "pdfplumber": "=== CV TEXT EXTRACTED WITH PDFPLUMBER ===\n\n",
+    "PyPDF2": "=== CV TEXT EXTRACTED WITH PYPDF2 ===\n\n",
+}
+
+def _write_pages(path, header, pages):
+    """Stream the header and page texts into path; return (characters of text, preview)
+
+    The text written is exactly "\n\n".join(page_texts).strip(), built one page at a time.
+    """
+    n_chars = 0
+    preview = io.StringIO()
+    # Trailing whitespace is held back and only written once more text follows it
+    pending = ""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(header)
+        for i, (_, page_text) in enumerate(pages):
+            chunk = (page_text or "") if i == 0 else "\n\n" + (page_text or "")
+            if n_chars == 0:
+                chunk = chunk.lstrip()
+            body = chunk.rstrip()
+            if not body:
+                if n_chars:
+                    pending += chunk
+                continue
+            out = pending + body
+            pending = chunk[len(body):]
+            f.write(out)
+            if n_chars < PREVIEW_CHARS:
+                preview.write(out[:PREVIEW_CHARS - n_chars])
+            n_chars += len(out)
+    return n_chars, preview.getvalue()
+
+def _scan_output(path):
+    """Return (characters of text, preview) for an existing output file, reading it in chunks"""
+    with open(path, "r", encoding="utf-8") as f:
+        # Skip the header line and the blank line after it
+        f.readline()
+        f.readline()
+        preview = f.read(PREVIEW_CHARS)
+        n_chars = len(preview)
+        for chunk in iter(partial(f.read, 1 << 16), ""):
+            n_chars += len(chunk)
+    return n_chars, preview
+
+def _discard(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+# Tried in order: PyMuPDF first (fastest), then pdfplumber (good for layouts), then PyPDF2.
+# Each entry is (name, importable module, page iterator).
+EXTRACTORS = [
+    ("PyMuPDF", "fitz", iter_pages_pymupdf),
+    ("pdfplumber", "pdfplumber", iter_pages_pdfplumber),
+    ("PyPDF2", "PyPDF2", iter_pages_pypdf2),
+]
+
+def _installed_extractors():
+    """Names of the extractors whose library can be imported, without importing it"""
+    return [name for name, module, _ in EXTRACTORS if importlib.util.find_spec(module) is not None]
+
+CACHE_DIR = ".cv_cache"
+# Bump whenever the output format changes so entries written by older versions are ignored
+CACHE_VERSION = 2
+
+def _cache_path(data, pages=None, extractors=()):
+    """Cache file for the given PDF bytes and page selection, keyed by their hash so edits invalidate it
+
+    The installed extractors are part of the key, so a result cached while e.g. PyMuPDF
+    was missing is not reused once it becomes available.
+    """
+    hasher = hashlib.blake2b(data, digest_size=16, salt=f"v{CACHE_VERSION}".encode())
+    if pages is not None:
+        hasher.update(repr(pages).encode())
+    hasher.update(",".join(extractors).encode())
+    digest = hasher.hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.txt")
+
+def _restore_cache(cache_path):
+    """Copy a cached extraction to OUTPUT_FILE; return False on a cache miss"""
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n\n"
-        return text.strip()
-    except Exception as e:
-        print(f"PyPDF2 extraction failed: {e}")
-        return None
-
-def extract_text_pdfplumber(pdf_path):
-    """Extract text using pdfplumber (usually better for complex layouts)"""
+        shutil.copyfile(cache_path, OUTPUT_FILE)
+        return True
+    except OSError:
+        return False
+
+def _write_cache(cache_path, source_path):
+    """Copy source_path into the cache atomically so a crash never leaves a partial entry"""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n\n"
-        return text.strip()
-    except Exception as e:
-        print(f"pdfplumber extraction failed: {e}")
-        return None
-
-def main():
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not write cache: {e}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract text from the CV PDF")
+    parser.add_argument(
+        "--pages",
+        help='1-based pages to extract, e.g. "1-3,7" (default: all pages)',
+    )
+    args = parser.parse_args(argv)
+    try:
+        pages = parse_pages(args.pages) if args.pages is not None else None
+    except argparse.ArgumentTypeError as e:
+        parser.error(f"argument --pages: {e}")
+    
     pdf_path = "222Frank_Digital_AB_Niklas_Andervang_CV_2025.pdf"
     
     print("=" * 60)
     print("EXTRACTING TEXT FROM CV PDF")
     print("=" * 60)
     print(f"Target file: {pdf_path}")
+    if args.pages is not None:
+        print(f"Pages: {args.pages}")
     
-    # Check if file exists
-    import os
-    if not os.path.exists(pdf_path):
+    # Check if file exists (a single stat also gives us the size)
+    try:
+        st = os.stat(pdf_path)
+    except FileNotFoundError:
         print(f"❌ File not found: {pdf_path}")
         print("Available files in current directory:")
-        for f in os.listdir("."):
-            if f.endswith(".pdf"):
-                print(f"  - {f}")
+        with os.scandir(".") as entries:
+            for entry in entries:
+                if entry.name.endswith(".pdf"):
+                    print(f"  - {entry.name}")
         return 1
     
     print(f"✅ File found: {pdf_path}")
-    print(f"File size: {os.path.getsize(pdf_path)} bytes")
+    print(f"File size: {st.st_size} bytes")
     
-    # Try pdfplumber first (usually better for formatting)
-    print("\n1. Trying pdfplumber extraction...")
-    text_plumber = extract_text_pdfplumber(pdf_path)
+    # Read the PDF once; the extractors parse it from memory
+    with open(pdf_path, 'rb') as file:
+        data = file.read()
     
-    if text_plumber:
-        print("✅ pdfplumber extraction successful!")
-        print(f"Extracted {len(text_plumber)} characters")
-        
-        # Save to file
-        with open("cv_extracted_text.txt", "w", encoding="utf-8") as f:
-            f.write("=== CV TEXT EXTRACTED WITH PDFPLUMBER ===\n\n")
-            f.write(text_plumber)
-        
-        print("✅ Text saved to cv_extracted_text.txt")
-        print("\n" + "="*60)
-        print("PREVIEW (first 500 characters):")
-        print("="*60)
-        print(text_plumber[:500])
-        if len(text_plumber) > 500:
-            print("\n... (truncated, see cv_extracted_text.txt for full content)")
-        
+    # Reuse a previous extraction if the PDF content is unchanged
+    cache_path = _cache_path(data, pages, _installed_extractors())
+    
+    if _restore_cache(cache_path):
+        print(f"\n✅ Unchanged PDF, loaded text from cache ({cache_path})")
+        n_chars, preview = _scan_output(OUTPUT_FILE)
     else:
-        print("❌ pdfplumber failed, trying PyPDF2...")
-        
-        # Fallback to PyPDF2
-        text_pypdf2 = extract_text_pypdf2(pdf_path)
-        
-        if text_pypdf2:
-            print("✅ PyPDF2 extraction successful!")
-            print(f"Extracted {len(text_pypdf2)} characters")
-            
-            # Save to file
-            with open("cv_extracted_text.txt", "w", encoding="utf-8") as f:
-                f.write("=== CV TEXT EXTRACTED WITH PYPDF2 ===\n\n")
-                f.write(text_pypdf2)
+        # Temp files live in the (ignored) cache directory and are always cleaned up,
+        # even if the run is interrupted mid-extraction
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_paths = [os.path.join(CACHE_DIR, f"{OUTPUT_FILE}.{name}.tmp") for name, _, _ in EXTRACTORS]
+        try:
+            # Pages are streamed straight to disk, so only one page of text is held in
+            # memory. Stop at the first method whose output looks complete; keep the
+            # longest suspicious result in case none of them do.
+            candidates = []
+            complete = False
+            for step, (name, _, iter_pages) in enumerate(EXTRACTORS, 1):
+                print(f"\n{step}. Trying {name} extraction...")
+                tmp_path = tmp_paths[step - 1]
+                try:
+                    n_chars, preview = _write_pages(tmp_path, OUTPUT_HEADERS[name], iter_pages(data, pages))
+                except PageRangeError as e:
+                    # A property of the document, not the extractor, so don't try the others
+                    print(f"❌ {e}")
+                    return 1
+                except ImportError:
+                    print(f"{name} extraction skipped: {name} is not installed")
+                    continue
+                except Exception as e:
+                    print(f"{name} extraction failed: {e}")
+                    n_chars, preview = 0, ""
+                
+                if _looks_good(preview, n_chars, pages):
+                    print(f"✅ {name} extraction successful!")
+                    chosen = (n_chars, name, preview, tmp_path)
+                    complete = True
+                    break
+                
+                if n_chars:
+                    print(f"⚠️ {name} returned only {n_chars} characters")
+                    candidates.append((n_chars, name, preview, tmp_path))
+                else:
+                    print(f"❌ {name} failed")
+            else:
+                if not candidates:
+                    print("❌ All extraction methods failed!")
+                    return 1
+                chosen = max(candidates, key=lambda candidate: candidate[0])
+                print(f"⚠️ No method produced a complete result, using {chosen[1]} output")
             
-            print("✅ Text saved to cv_extracted_text.txt")
-            print("\n" + "="*60)
-            print("PREVIEW (first 500 characters):")
-            print("="*60)
-            print(text_pypdf2[:500])
-            if len(text_pypdf2) > 500:
-                print("\n... (truncated, see cv_extracted_text.txt for full content)")
+            n_chars, name, preview, tmp_path = chosen
+            os.replace(tmp_path, OUTPUT_FILE)
+        finally:
+            for path in tmp_paths:
+                _discard(path)
+        
+        # An incomplete result is retried next run rather than cached
+        if complete:
+            _write_cache(cache_path, OUTPUT_FILE)
         else:
-            print("❌ Both extraction methods failed!")
-            return 1
+            print(f"⚠️ Not caching incomplete {name} result")
+    
+    print(f"Extracted {n_chars} characters")
+    print(f"✅ Text saved to {OUTPUT_FILE}")
+    print("\n" + "="*60)
+    print(f"PREVIEW (first {PREVIEW_CHARS} characters):")
+    print("="*60)
+    print(preview)
+    if n_chars > PREVIEW_CHARS:
+        print(f"\n... (truncated, see {OUTPUT_FILE} for full content)")
     
     return 0
 